@@ -1,10 +1,15 @@
+import functools
+import io
 import json  # noqa: F401
 import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from textwrap import dedent
 from typing import List, Set, Optional, Tuple, Union, Dict
 
 import boto3
-from attrs import define
+from attrs import define, field
 from botocore.model import ServiceModel, StringShape, ListShape, Shape, StructureShape, MapShape
 from jsons import pascalcase
 
@@ -12,7 +17,7 @@ from resotolib.types import JsonElement
 from resotolib.utils import utc_str
 
 
-@define
+@define(slots=True, frozen=True)
 class AwsProperty:
     name: str
     from_name: Union[str, List[str]]
@@ -22,37 +27,42 @@ class AwsProperty:
     is_complex: bool = False
     field_default: Optional[str] = None
     extractor: Optional[str] = None
+    # render results are pure functions of the frozen fields: computed lazily, cached on the instance
+    _type_string: Optional[str] = field(default=None, init=False, eq=False, repr=False)
+    _mapping: Optional[str] = field(default=None, init=False, eq=False, repr=False)
 
     def assignment(self) -> str:
         default = self.field_default or ("factory=list" if self.is_array else "default=None")
         return f"field({default})"
 
     def type_string(self) -> str:
-        if self.is_array:
-            return f"List[{self.type}]"
-        else:
-            return f"Optional[{self.type}]"
+        if self._type_string is None:
+            rendered = f"List[{self.type}]" if self.is_array else f"Optional[{self.type}]"
+            object.__setattr__(self, "_type_string", rendered)
+        return self._type_string
 
     def mapping(self) -> str:
+        if self._mapping is not None:
+            return self._mapping
         # in case an extractor is defined explicitly
         if self.extractor:
-            return f'"{self.name}": {self.extractor}'
-        from_p = self.from_name if isinstance(self.from_name, list) else [self.from_name]
-        from_p_path = ",".join(f'"{p}"' for p in from_p)
-        base = f'"{self.name}": S({from_p_path}'
-        if self.is_array and self.is_complex:
-            base += f", default=[]) >> ForallBend({self.type}.mapping)"
-        elif self.is_array:
-            base += ", default=[])"
-        elif self.is_complex:
-            base += f") >> Bend({self.type}.mapping)"
+            rendered = f'"{self.name}": {self.extractor}'
         else:
-            base += ")"
-
-        return base
+            from_p = self.from_name if isinstance(self.from_name, list) else [self.from_name]
+            from_p_path = ",".join(f'"{p}"' for p in from_p)
+            if self.is_array and self.is_complex:
+                rendered = f'"{self.name}": S({from_p_path}, default=[]) >> ForallBend({self.type}.mapping)'
+            elif self.is_array:
+                rendered = f'"{self.name}": S({from_p_path}, default=[])'
+            elif self.is_complex:
+                rendered = f'"{self.name}": S({from_p_path}) >> Bend({self.type}.mapping)'
+            else:
+                rendered = f'"{self.name}": S({from_p_path})'
+        object.__setattr__(self, "_mapping", rendered)
+        return rendered
 
 
-@define
+@define(slots=True)
 class AwsModel:
     name: str
     props: List[AwsProperty]
@@ -63,12 +73,6 @@ class AwsModel:
     def to_class(self) -> str:
         bc = ", " + self.base_class if self.base_class else ""
         base = f"(AwsResource{bc}):" if self.aggregate_root else ":"
-        kind = f'    kind: ClassVar[str] = "aws_{to_snake(self.name[3:])}"'
-        if self.api_info:
-            srv, act, res = self.api_info
-            api = f'    api_spec: ClassVar[AwsApiSpec] = AwsApiSpec("{srv}", "{act}", "{res}")\n'
-        else:
-            api = ""
         base_mapping = {
             "id": 'S("id")',
             "tags": 'S("Tags", default=[]) >> ToDict()',
@@ -77,17 +81,25 @@ class AwsModel:
             "mtime": "K(None)",
             "atime": "K(None)",
         }
-        mapping = "    mapping: ClassVar[Dict[str, Bender]] = {\n"
-        if self.aggregate_root:
-            mapping += ",\n".join(f'        "{k}": {v}' for k, v in base_mapping.items())
-            mapping += ",\n"
-        mapping += ",\n".join(f"        {p.mapping()}" for p in self.props)
-        mapping += "\n    }"
-        props = "\n".join(f"    {p.name}: {p.type_string()} = {p.assignment()}" for p in self.props)
-        return f"@define(eq=False, slots=False)\nclass {self.name}{base}\n{kind}\n{api}{mapping}\n{props}\n"
+        lines = [
+            "@define(eq=False, slots=False)",
+            f"class {self.name}{base}",
+            f'    kind: ClassVar[str] = "aws_{to_snake(self.name[3:])}"',
+        ]
+        if self.api_info:
+            srv, act, res = self.api_info
+            lines.append(f'    api_spec: ClassVar[AwsApiSpec] = AwsApiSpec("{srv}", "{act}", "{res}")')
+        entries = [f'"{k}": {v}' for k, v in base_mapping.items()] if self.aggregate_root else []
+        entries.extend(p.mapping() for p in self.props)
+        lines.append("    mapping: ClassVar[Dict[str, Bender]] = {")
+        lines.append(",\n".join(f"        {e}" for e in entries))
+        lines.append("    }")
+        lines.extend(f"    {p.name}: {p.type_string()} = {p.assignment()}" for p in self.props)
+        lines.append("")
+        return "\n".join(lines)
 
 
-@define
+@define(slots=True)
 class AwsResotoModel:
     api_action: str  # action to perform on the client
     result_property: str  # this property holds the resulting list
@@ -98,10 +110,16 @@ class AwsResotoModel:
     base: Optional[str] = None  # the base class to use, BaseResource otherwise
 
 
+_SNAKE1 = re.compile(r"(.)([A-Z][a-z]+)")
+_SNAKE2 = re.compile(r"__([A-Z])")
+_SNAKE3 = re.compile(r"([a-z0-9])([A-Z])")
+
+
+@functools.lru_cache(maxsize=None)
 def to_snake(name: str) -> str:
-    name = re.sub("(.)([A-Z][a-z]+)", r"\1_\2", name)
-    name = re.sub("__([A-Z])", r"_\1", name)
-    name = re.sub("([a-z0-9])([A-Z])", r"\1_\2", name)
+    name = _SNAKE1.sub(r"\1_\2", name)
+    name = _SNAKE2.sub(r"_\1", name)
+    name = _SNAKE3.sub(r"\1_\2", name)
     return name.lower()
 
 
@@ -122,8 +140,22 @@ simple_type_map |= {k.lower(): v for k, v in simple_type_map.items()}
 ignore_props = {"Tags", "tags"}
 
 
+_SESSION = boto3.Session()
+_SESSION_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
 def service_model(name: str) -> ServiceModel:
-    return boto3.client(name, region_name="us-east-1")._service_model
+    # boto3 sessions are not thread-safe for client creation: serialize it
+    with _SESSION_LOCK:
+        return _SESSION.client(name, region_name="us-east-1")._service_model
+
+
+# plain nested models are pure functions of (prefix, shape name): remember the
+# generated list so shared shapes (Tag, Filter, ...) are walked only once
+_clazz_model_cache: Dict[Tuple[str, str], List[AwsModel]] = {}
+# cache keys whose isolated walk is still on the stack; each worker thread walks independently
+_walking = threading.local()
 
 
 def clazz_model(
@@ -141,14 +173,12 @@ def clazz_model(
         return spl if spl else f"Aws{prefix}{s.name}"
 
     def simple_shape(s: Shape) -> Optional[str]:
-        if isinstance(s, StringShape):
-            return "str"
-        elif simple := simple_type_map.get(s.name):
-            return simple
-        elif simple := simple_type_map.get(s.type_name):
+        # string shapes resolve via the "string" entry, so the isinstance fallback is almost never taken
+        get = simple_type_map.get
+        if simple := get(s.type_name) or get(s.name):
             return simple
         else:
-            return None
+            return "str" if isinstance(s, StringShape) else None
 
     def complex_simple_shape(s: Shape) -> Optional[Tuple[str, str]]:
         # in case this shape is complex, but has only property of simple type, return that type
@@ -159,13 +189,89 @@ def clazz_model(
         else:
             return None
 
-    if type_name(shape) in visited:
+    prefix = prefix or ""
+    prop_prefix = prop_prefix or ""
+    tn = type_name(shape)
+    if tn in visited:
         return []
-    visited.add(type_name(shape))
+
+    def merge_cached(cached: List[AwsModel]) -> List[AwsModel]:
+        # take over the models the caller's walk has not seen yet
+        fresh = [model for model in cached if model.name not in visited]
+        visited.update(model.name for model in fresh)
+        visited.add(tn)
+        return fresh
+
+    cacheable = clazz_name is None and base_class is None and api_info is None and not aggregate_root
+    if cacheable and (cached := _clazz_model_cache.get((prefix, tn))) is not None:
+        return merge_cached(cached)
+    walking = getattr(_walking, "keys", None)
+    if walking is None:
+        walking = _walking.keys = set()
+    # shapes can be mutually recursive: when a shape is re-entered while its own
+    # isolated walk is still in progress further up the stack, fall back to an
+    # uncached walk over the caller's visited set so the recursion terminates
+    cacheable = cacheable and (prefix, tn) not in walking
+    # walk cacheable shapes with an isolated set seeded with their own type name,
+    # so the cached list is complete and independent of the caller's walk state
+    walk_visited = {tn} if cacheable else visited
+    if cacheable:
+        walking.add((prefix, tn))
+    else:
+        visited.add(tn)
     result: List[AwsModel] = []
     props = []
-    prefix = prefix or ""
-    prop_prefix = prop_prefix or ""
+
+    def handle_list(name: str, prop: str, prop_shape: ListShape) -> None:
+        inner = prop_shape.member
+        if simple := simple_shape(inner):
+            props.append(AwsProperty(prop_prefix + prop, name, simple, prop_shape.documentation, is_array=True))
+        elif simple_path := complex_simple_shape(inner):
+            prop_name, prop_type = simple_path
+            props.append(
+                AwsProperty(
+                    prop_prefix + prop,
+                    [name, prop_name],
+                    prop_type,
+                    prop_shape.documentation,
+                    is_array=True,
+                    extractor=f'S("{name}", default=[]) >> ForallBend(S("{prop_name}"))',
+                )
+            )
+
+        else:
+            inner_tn = type_name(inner)
+            result.extend(clazz_model(inner, walk_visited, prefix))
+            props.append(
+                AwsProperty(
+                    prop_prefix + prop,
+                    name,
+                    inner_tn,
+                    prop_shape.documentation,
+                    is_array=True,
+                    is_complex=True,
+                )
+            )
+
+    def handle_map(name: str, prop: str, prop_shape: MapShape) -> None:
+        key_type = simple_shape(prop_shape.key)
+        assert key_type, f"Key type must be a simple type: {prop_shape.key.name}"
+        value_type = type_name(prop_shape.value)
+        result.extend(clazz_model(prop_shape.value, walk_visited, prefix))
+        props.append(AwsProperty(prop_prefix + prop, name, f"Dict[{key_type}, {value_type}]", prop_shape.documentation))
+
+    def handle_structure(name: str, prop: str, prop_shape: StructureShape) -> None:
+        if maybe_simple := complex_simple_shape(prop_shape):
+            s_prop_name, s_prop_type = maybe_simple
+            props.append(AwsProperty(prop_prefix + prop, [name, s_prop_name], s_prop_type, prop_shape.documentation))
+        else:
+            result.extend(clazz_model(prop_shape, walk_visited, prefix))
+            props.append(
+                AwsProperty(prop_prefix + prop, name, type_name(prop_shape), prop_shape.documentation, is_complex=True)
+            )
+
+    # dispatch on botocore's type_name string instead of a chain of isinstance checks
+    handlers = {"list": handle_list, "map": handle_map, "structure": handle_structure}
     if isinstance(shape, StructureShape):
         for name, prop_shape in shape.members.items():
             prop = to_snake(name)
@@ -173,89 +279,50 @@ def clazz_model(
                 continue
             if simple := simple_shape(prop_shape):
                 props.append(AwsProperty(prop_prefix + prop, name, simple, prop_shape.documentation))
-            elif isinstance(prop_shape, ListShape):
-                inner = prop_shape.member
-                if simple := simple_shape(inner):
-                    props.append(AwsProperty(prop_prefix + prop, name, simple, prop_shape.documentation, is_array=True))
-                elif simple_path := complex_simple_shape(inner):
-                    prop_name, prop_type = simple_path
-                    props.append(
-                        AwsProperty(
-                            prop_prefix + prop,
-                            [name, prop_name],
-                            prop_type,
-                            prop_shape.documentation,
-                            is_array=True,
-                            extractor=f'S("{name}", default=[]) >> ForallBend(S("{prop_name}"))',
-                        )
-                    )
-
-                else:
-                    result.extend(clazz_model(inner, visited, prefix))
-                    props.append(
-                        AwsProperty(
-                            prop_prefix + prop,
-                            name,
-                            type_name(inner),
-                            prop_shape.documentation,
-                            is_array=True,
-                            is_complex=True,
-                        )
-                    )
-            elif isinstance(prop_shape, MapShape):
-                key_type = simple_shape(prop_shape.key)
-                assert key_type, f"Key type must be a simple type: {prop_shape.key.name}"
-                value_type = type_name(prop_shape.value)
-                result.extend(clazz_model(prop_shape.value, visited, prefix))
-                props.append(
-                    AwsProperty(prop_prefix + prop, name, f"Dict[{key_type}, {value_type}]", prop_shape.documentation)
-                )
-
-            elif isinstance(prop_shape, StructureShape):
-                if maybe_simple := complex_simple_shape(prop_shape):
-                    s_prop_name, s_prop_type = maybe_simple
-                    props.append(
-                        AwsProperty(prop_prefix + prop, [name, s_prop_name], s_prop_type, prop_shape.documentation)
-                    )
-                else:
-                    result.extend(clazz_model(prop_shape, visited, prefix))
-                    props.append(
-                        AwsProperty(
-                            prop_prefix + prop, name, type_name(prop_shape), prop_shape.documentation, is_complex=True
-                        )
-                    )
+            elif handler := handlers.get(prop_shape.type_name):
+                handler(name, prop, prop_shape)
             else:
                 raise NotImplementedError(f"Unsupported shape: {prop_shape}")
 
-        clazz_name = clazz_name if clazz_name else type_name(shape)
+        clazz_name = clazz_name if clazz_name else tn
         result.append(AwsModel(clazz_name, props, aggregate_root, base_class, api_info))
+    if cacheable:
+        walking.discard((prefix, tn))
+        _clazz_model_cache[(prefix, tn)] = result
+        return merge_cached(result)
     return result
 
 
 def all_models() -> List[AwsModel]:
-    visited: Set[str] = set()
-    result: List[AwsModel] = []
-    for name, endpoints in models.items():
+    def models_for(name: str, ep: AwsResotoModel) -> List[AwsModel]:
         sm = service_model(name)
-        for ep in endpoints:
-            shape = (
-                sm.shape_for(ep.result_shape)
-                if ep.result_shape
-                else sm.operation_model(pascalcase(ep.api_action)).output_shape
-            )
-            result.extend(
-                clazz_model(
-                    shape,
-                    visited,
-                    aggregate_root=True,
-                    clazz_name=ep.name,
-                    base_class=ep.base,
-                    prop_prefix=ep.prop_prefix,
-                    prefix=ep.prefix,
-                    api_info=(name, ep.api_action, ep.result_property),
-                )
-            )
+        shape = (
+            sm.shape_for(ep.result_shape)
+            if ep.result_shape
+            else sm.operation_model(pascalcase(ep.api_action)).output_shape
+        )
+        return clazz_model(
+            shape,
+            set(),
+            aggregate_root=True,
+            clazz_name=ep.name,
+            base_class=ep.base,
+            prop_prefix=ep.prop_prefix,
+            prefix=ep.prefix,
+            api_info=(name, ep.api_action, ep.result_property),
+        )
 
+    result: List[AwsModel] = []
+    seen: Set[str] = set()
+    with ThreadPoolExecutor(max_workers=min(32, max(1, len(models)))) as executor:
+        futures = [executor.submit(models_for, name, ep) for name, endpoints in models.items() for ep in endpoints]
+        # every endpoint walks with its own visited set and cache entries are walk-independent,
+        # so gathering in submission order yields the same output for every thread schedule
+        for future in futures:
+            for model in future.result():
+                if model.name not in seen:
+                    seen.add(model.name)
+                    result.append(model)
     return result
 
 
@@ -997,6 +1064,8 @@ if __name__ == "__main__":
 
     """print the class models"""
     # print(default_imports())
+    buf = io.StringIO()
     for model in all_models():
-        # pass
-        print(model.to_class())
+        buf.write(model.to_class())
+        buf.write("\n")
+    sys.stdout.write(buf.getvalue())
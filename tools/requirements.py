@@ -1,5 +1,5 @@
 # Before calling this script:
-# pip install toml pip-tools
+# pip install pip-tools (and tomli on Python < 3.11)
 #
 # Run this script from the root of the repository
 # python tools/requirements.py
@@ -11,9 +11,15 @@
 # - a requirements-test.txt file with project and test dependencies
 #
 import os
+import re
+import subprocess
 from collections import defaultdict
-from typing import Any, Dict, List, Iterator, Optional
-import toml
+from typing import Any, Dict, List, Iterator, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib  # Python < 3.11
 
 
 class ProjectDefinition:
@@ -37,36 +43,55 @@ class ProjectDefinition:
         return self.dependencies + [dep for deps in self.optional_dependencies.values() for dep in deps]
 
 
+ignore_dirs = {
+    ".git",
+    "site-packages",
+    ".venv",
+    "venv",
+    "node_modules",
+    "build",
+    "dist",
+    ".tox",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    "target",
+}
+
+
 def all_project_definitions() -> Iterator[ProjectDefinition]:
-    for root, _, files in os.walk("."):
-        if "site-packages" in root or ".git" in root:
-            continue
+    for root, dirs, files in os.walk("."):
+        # prune ignored subtrees in place instead of descending into them
+        dirs[:] = [d for d in dirs if d not in ignore_dirs]
         for file in files:
             if file == "pyproject.toml":
                 print(f"Found pyproject.toml in {root}")
                 file_path = os.path.join(root, file)
                 try:
-                    with open(file_path) as f:
-                        yield ProjectDefinition(toml.load(f))
+                    with open(file_path, "rb") as f:
+                        yield ProjectDefinition(tomllib.load(f))
                 except Exception as e:
                     print(f"Failed to parse {file_path}: {e}")
                     raise
 
 
 filter_out = ["resotolib", "resoto-plugin-aws"]
+filter_out_re = re.compile("|".join(re.escape(name) for name in filter_out))
 
 
 def filter_dependencies(deps: List[str]) -> List[str]:
-    return [dep for dep in deps if not any(name in dep for name in filter_out)]
+    return [dep for dep in deps if not filter_out_re.search(dep)]
 
 
-def compile_dependencies(name: Optional[str], deps: List[str]) -> None:
+def compile_dependencies(name: Optional[str], deps: List[str]) -> Tuple["subprocess.Popen[bytes]", str]:
     delim = "-" + name if name else ""
-    with open(f"requirements{delim}-in.txt", "w") as f:
-        f.write("\n".join(deps))
-    args = "-q --no-annotate --resolver=backtracking --upgrade --allow-unsafe --no-header  --unsafe-package n/a"
-    os.system(f"pip-compile {args} --output-file requirements{delim}.txt requirements{delim}-in.txt")
-    os.remove(f"requirements{delim}-in.txt")
+    in_file = f"requirements{delim}-in.txt"
+    with open(in_file, "w") as f:
+        # every project re-declares common libs: dedup while keeping order
+        f.write("\n".join(dict.fromkeys(deps)))
+    args = ["-q", "--no-annotate", "--resolver=backtracking", "--upgrade", "--allow-unsafe", "--no-header"]
+    args += ["--unsafe-package", "n/a", "--output-file", f"requirements{delim}.txt", in_file]
+    return subprocess.Popen(["pip-compile", *args]), in_file
 
 
 def combine_dependencies() -> None:
@@ -78,11 +103,20 @@ def combine_dependencies() -> None:
             optional_dependencies[name].extend(filter_dependencies(deps))
     all_dependencies = prod_dependencies.copy()
 
-    compile_dependencies(None, prod_dependencies)
+    # the pip-compile runs are independent, so let them resolve concurrently
+    compilations = [compile_dependencies(None, prod_dependencies)]
     for name, deps in optional_dependencies.items():
         all_dependencies.extend(deps)
-        compile_dependencies(name, deps + prod_dependencies)
-    compile_dependencies("all", all_dependencies)
+        compilations.append(compile_dependencies(name, deps + prod_dependencies))
+    compilations.append(compile_dependencies("all", all_dependencies))
+    # wait for every run and clean up all inputs before reporting failures
+    failed = []
+    for process, in_file in compilations:
+        if process.wait() != 0:
+            failed.append(in_file)
+        os.remove(in_file)
+    if failed:
+        raise RuntimeError(f"pip-compile failed for: {', '.join(failed)}")
 
 
 if __name__ == "__main__":